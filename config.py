@@ -1,32 +1,127 @@
+"""Configuration settings for the Flask application"""
+from __future__ import annotations
+
 import os
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-class Config:
-    """Configuration class for the Flask application"""
-    
-    # Supabase configuration
-    SUPABASE_URL = os.getenv('SUPABASE_URL')
-    SUPABASE_KEY = os.getenv('SUPABASE_KEY')
-    
-    # Flask configuration
-    SECRET_KEY = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-change-in-production')
-    
-    # Session configuration
-    SESSION_COOKIE_HTTPONLY = True
-    SESSION_COOKIE_SAMESITE = 'Lax'
-    PERMANENT_SESSION_LIFETIME = 86400  # 24 hours
-    
-    # Debug mode (should be False in production)
-    DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
-    
-    # Clear any proxy-related environment variables that might interfere with Supabase
-    @staticmethod
-    def clear_proxy_env():
-        """Clear proxy environment variables that might cause issues with Supabase"""
-        proxy_vars = ['HTTP_PROXY', 'HTTPS_PROXY', 'http_proxy', 'https_proxy', 'ALL_PROXY', 'all_proxy']
-        for var in proxy_vars:
-            if var in os.environ:
-                del os.environ[var]
+from datetime import timedelta
+from typing import Final
+
+__all__ = [
+    'SUPABASE_URL',
+    'SUPABASE_KEY',
+    'SECRET_KEY',
+    'SESSION_COOKIE_HTTPONLY',
+    'SESSION_COOKIE_SAMESITE',
+    'PERMANENT_SESSION_LIFETIME',
+    'DEBUG',
+    'PRODUCTION',
+    'STATIC_MAX_AGE',
+    'APPROVAL_WAIT_TIMEOUT',
+    'BCRYPT_ROUNDS',
+    'BLACKLIST_CACHE_TTL',
+    'APPROVAL_STATUS_CACHE_TTL',
+    'APPROVAL_DECISION_CACHE_TTL',
+    'LOG_LEVEL',
+    'SUPABASE_TIMEOUT',
+    'SUPABASE_CONNECT_TIMEOUT',
+    'SUPABASE_MAX_CONNECTIONS',
+    'SUPABASE_MAX_KEEPALIVE_CONNECTIONS',
+    'SUPABASE_KEEPALIVE_EXPIRY',
+    'clear_proxy_env',
+]
+
+# Bind the process environment once; every lookup below goes through it
+_ENV = os.environ
+
+# Load environment variables from .env file (skipped in production, where the
+# platform injects them, or when FLASK_SKIP_DOTENV is set)
+if not _ENV.get('FLASK_SKIP_DOTENV') and _ENV.get('FLASK_ENV') != 'production':
+    from dotenv import dotenv_values
+
+    # Merge in a single update; variables already set in the environment win
+    _ENV.update({k: v for k, v in dotenv_values().items() if v is not None and k not in _ENV})
+
+# Accepted spellings for boolean settings; anything else reads as False
+_BOOL_MAP = {
+    'true': True, '1': True, 'yes': True, 'on': True, 'y': True, 't': True,
+    'false': False, '0': False, 'no': False, 'off': False, 'n': False, 'f': False, '': False,
+}
+
+# Proxy variables that interfere with the Supabase client
+_PROXY_VARS = frozenset(['HTTP_PROXY', 'HTTPS_PROXY', 'http_proxy', 'https_proxy', 'ALL_PROXY', 'all_proxy'])
+
+# Supabase configuration, resolved lazily on first access (see __getattr__)
+_LAZY = frozenset({'SUPABASE_URL', 'SUPABASE_KEY'})
+
+# Supabase HTTP connection pool; keep SUPABASE_MAX_CONNECTIONS under the
+# project's connection limit
+SUPABASE_TIMEOUT: Final[float] = float(_ENV.get('SUPABASE_TIMEOUT', '10'))
+SUPABASE_CONNECT_TIMEOUT: Final[float] = float(_ENV.get('SUPABASE_CONNECT_TIMEOUT', '5'))
+SUPABASE_MAX_CONNECTIONS: Final[int] = int(_ENV.get('SUPABASE_MAX_CONNECTIONS', '20'))
+SUPABASE_MAX_KEEPALIVE_CONNECTIONS: Final[int] = int(_ENV.get('SUPABASE_MAX_KEEPALIVE_CONNECTIONS', '10'))
+SUPABASE_KEEPALIVE_EXPIRY: Final[float] = float(_ENV.get('SUPABASE_KEEPALIVE_EXPIRY', '40'))
+
+# Flask configuration
+SECRET_KEY: Final[str] = _ENV.get('FLASK_SECRET_KEY', 'your-secret-key-change-in-production')
+
+# Session configuration
+SESSION_COOKIE_HTTPONLY: Final[bool] = True
+SESSION_COOKIE_SAMESITE: Final[str] = 'Lax'
+PERMANENT_SESSION_LIFETIME: Final[timedelta] = timedelta(hours=24)
+
+# Debug mode (should be False in production)
+DEBUG: Final[bool] = _BOOL_MAP.get(_ENV.get('FLASK_DEBUG', '').strip().lower(), False)
+
+# Production deployments (FLASK_ENV=production) leave out the /test routes
+PRODUCTION: Final[bool] = _ENV.get('FLASK_ENV') == 'production'
+
+# Seconds browsers may reuse the dashboard CSS/JS and installer scripts
+# before revalidating them
+STATIC_MAX_AGE: Final[int] = int(_ENV.get('STATIC_MAX_AGE', '3600'))
+
+# Logging level for the server's own logger; DEBUG enables per-request
+# diagnostics. Unknown names fall back to INFO.
+_LOG_LEVELS = frozenset({'CRITICAL', 'ERROR', 'WARNING', 'INFO', 'DEBUG'})
+LOG_LEVEL: Final[str] = _ENV.get('LOG_LEVEL', 'INFO').strip().upper()
+if LOG_LEVEL not in _LOG_LEVELS:
+    LOG_LEVEL = 'INFO'
+
+# Longest a /api/wait_approval long-poll is held open, in seconds; keep it
+# a few seconds under the platform's request time limit, which must also cover
+# the final status check after the wait
+APPROVAL_WAIT_TIMEOUT: Final[float] = float(_ENV.get('APPROVAL_WAIT_TIMEOUT', '8'))
+
+# bcrypt cost factor for password hashes (values below 10 are raised to 10);
+# run `flask --app server bench-bcrypt` to pick one that fits the login budget
+BCRYPT_ROUNDS: Final[int] = max(int(_ENV.get('BCRYPT_ROUNDS', '12')), 10)
+
+# Seconds a user's blacklist is cached for agent command checks
+BLACKLIST_CACHE_TTL: Final[float] = float(_ENV.get('BLACKLIST_CACHE_TTL', '30'))
+
+# Seconds an approval request's status is reused across polls of the same id
+APPROVAL_STATUS_CACHE_TTL: Final[float] = float(_ENV.get('APPROVAL_STATUS_CACHE_TTL', '1'))
+
+# Seconds a decided (approved, denied or expired) request's status is kept
+APPROVAL_DECISION_CACHE_TTL: Final[float] = float(_ENV.get('APPROVAL_DECISION_CACHE_TTL', '300'))
+
+def __getattr__(name):
+    """Resolve lazy settings on first access and memoize them as module globals"""
+    if name in _LAZY:
+        value = _ENV.get(name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Clear any proxy-related environment variables that might interfere with Supabase
+_proxy_cleared = False
+
+def clear_proxy_env():
+    """Clear proxy environment variables that might cause issues with Supabase (runs once)"""
+    global _proxy_cleared
+    if _proxy_cleared:
+        return
+    for var in _PROXY_VARS & _ENV.keys():
+        _ENV.pop(var, None)
+    _proxy_cleared = True
+
+# Proxy variables are cleared once at import; later calls are no-ops
+clear_proxy_env()
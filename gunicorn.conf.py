@@ -0,0 +1,15 @@
+"""Gunicorn settings for self-hosted deployments
+
+Run `gunicorn` from the project root; this file is picked up automatically.
+"""
+import os
+
+wsgi_app = 'server:app'
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Requests spend most of their time waiting on Supabase. gevent workers
+# monkey-patch sockets, so one worker keeps many of those round trips in
+# flight at once instead of blocking an OS thread per request.
+worker_class = 'gevent'
+workers = int(os.environ.get('WEB_CONCURRENCY', '4'))
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', '1000'))
@@ -115,7 +115,8 @@ function handle_blocked_command() {
             return 1
         fi
         
-        local status_response=$(curl -s "${SAFE_CLI_SERVER}/api/check_approval/${request_id}")
+        # Long-poll: the server answers as soon as the request is decided
+        local status_response=$(curl -s --max-time $((remaining + 5)) "${SAFE_CLI_SERVER}/api/wait_approval/${request_id}?timeout=${remaining}")
         local status=$(echo "$status_response" | jq -r '.status // empty' 2>/dev/null || echo "")
         
         if [ "$status" == "approved" ]; then
@@ -130,7 +131,10 @@ function handle_blocked_command() {
         fi
         
         printf "\r${YELLOW}Waiting for approval... %ds remaining${NC}" "$remaining"
-        sleep 1
+        # Only back off when the server did not answer with a status
+        if [ -z "$status" ]; then
+            sleep 1
+        fi
     done
 }
 
@@ -0,0 +1,33 @@
+"""Request body schemas for the agent-facing API endpoints"""
+from uuid import UUID
+
+from pydantic import BaseModel
+
+
+class CheckCommandIn(BaseModel):
+    """Body of POST /api/agent/check_command"""
+    command: str
+    root_user_id: UUID
+    endpoint_id: UUID
+
+
+class RegisterEndpointIn(BaseModel):
+    """Body of POST /api/register_endpoint"""
+    root_user_id: UUID
+    name: str
+    hostname: str
+    user_name: str
+    os_info: str = ''
+
+
+class RequestApprovalIn(BaseModel):
+    """Body of POST /api/request_approval"""
+    endpoint_id: UUID
+    user: str
+    command: str
+
+
+class AgentDeregisterIn(BaseModel):
+    """Body of POST /api/agent/deregister"""
+    endpoint_id: UUID
+    root_user_id: UUID
@@ -1,68 +1,249 @@
-from flask import Flask, request, jsonify, render_template_string, session, redirect, url_for, send_from_directory
+from flask import Flask, request, jsonify, render_template_string, session, redirect, url_for, send_from_directory, g
+from flask.json.provider import JSONProvider
+import logging
+import math
+import os
 import time
+import threading
 import uuid
 import socket
 import platform
 import bcrypt
-from datetime import datetime, timezone
-from supabase import create_client, Client
-from config import Config
+import decimal
+import hashlib
+import httpx
+import orjson
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from typing import Optional
+from postgrest.utils import SyncClient
+from pydantic import ValidationError
+from supabase import create_client, Client, ClientOptions
+import config
+from schemas import AgentDeregisterIn, CheckCommandIn, RegisterEndpointIn, RequestApprovalIn
+
+# LOG_LEVEL applies to this module's logger only; the root logger stays at its
+# WARNING default so library loggers such as httpx don't log every round trip
+logger = logging.getLogger(__name__)
+logger.setLevel(config.LOG_LEVEL)
+if not logger.handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    logger.addHandler(_log_handler)
+
+# --- JSON Encoding ---
+def _json_default(obj):
+    """Encode the types orjson does not handle natively"""
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider that encodes and decodes with orjson"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_json_default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response, skipping the str round trip
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+        return self._app.response_class(body, mimetype='application/json')
 
 # Initialize the Flask application
 app = Flask(__name__)
-app.config.from_object(Config)
-app.secret_key = Config.SECRET_KEY
+app.json = OrjsonProvider(app)
+app.config.from_object(config)
+app.secret_key = config.SECRET_KEY
 
-# Configure session to work properly
-app.config['SESSION_COOKIE_HTTPONLY'] = True
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-app.config['PERMANENT_SESSION_LIFETIME'] = 86400  # 24 hours
+# Clear proxy environment variables once at startup; never call this from a
+# request handler
+config.clear_proxy_env()
+
+# Approval requests are rejected once they have been pending this long
+APPROVAL_TIMEOUT = timedelta(seconds=30)
 
 # --- Supabase Client ---
+# One client per process, built on first use and shared by every request
+_SUPABASE_CLIENT: Optional[Client] = None
+_CLIENT_LOCK = threading.Lock()
+
+def _pooled_session(session: SyncClient) -> SyncClient:
+    """Rebuild a PostgREST HTTP session on a bounded keep-alive pool with retries"""
+    transport = httpx.HTTPTransport(
+        http2=True,
+        retries=3,
+        limits=httpx.Limits(
+            max_connections=config.SUPABASE_MAX_CONNECTIONS,
+            max_keepalive_connections=config.SUPABASE_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.SUPABASE_KEEPALIVE_EXPIRY
+        )
+    )
+    pooled = SyncClient(
+        base_url=session.base_url,
+        headers=session.headers,
+        timeout=httpx.Timeout(config.SUPABASE_TIMEOUT, connect=config.SUPABASE_CONNECT_TIMEOUT),
+        follow_redirects=True,
+        transport=transport
+    )
+    session.close()
+    return pooled
+
 def get_supabase_client() -> Client:
-    """Get Supabase client"""
-    if not Config.SUPABASE_URL or not Config.SUPABASE_KEY:
-        print(f"ERROR: Supabase configuration missing!")
-        print(f"SUPABASE_URL: {'SET' if Config.SUPABASE_URL else 'MISSING'}")
-        print(f"SUPABASE_KEY: {'SET' if Config.SUPABASE_KEY else 'MISSING'}")
-        print("Please create a .env file with your Supabase credentials")
+    """Get the shared Supabase client, creating it on first use"""
+    global _SUPABASE_CLIENT
+    if _SUPABASE_CLIENT is not None:
+        return _SUPABASE_CLIENT
+
+    if not config.SUPABASE_URL or not config.SUPABASE_KEY:
+        logger.error("Supabase configuration missing! SUPABASE_URL: %s, SUPABASE_KEY: %s",
+                     'SET' if config.SUPABASE_URL else 'MISSING',
+                     'SET' if config.SUPABASE_KEY else 'MISSING')
+        logger.error("Please create a .env file with your Supabase credentials")
         raise Exception("Supabase URL and Key must be set in environment variables")
     
-    try:
-        # Clear any proxy environment variables that might cause issues
-        Config.clear_proxy_env()
-        
-        # Create client with explicit parameters to avoid proxy issues
-        client = create_client(
-            supabase_url=Config.SUPABASE_URL,
-            supabase_key=Config.SUPABASE_KEY
-        )
-        return client
-    except Exception as e:
-        print(f"ERROR: Failed to create Supabase client: {str(e)}")
-        raise Exception(f"Failed to initialize Supabase client: {str(e)}")
+    with _CLIENT_LOCK:
+        if _SUPABASE_CLIENT is None:
+            try:
+                # Create client with explicit parameters to avoid proxy issues
+                client = create_client(
+                    supabase_url=config.SUPABASE_URL,
+                    supabase_key=config.SUPABASE_KEY,
+                    options=ClientOptions(postgrest_client_timeout=config.SUPABASE_TIMEOUT)
+                )
+                client.postgrest.session = _pooled_session(client.postgrest.session)
+                _SUPABASE_CLIENT = client
+            except Exception as e:
+                logger.error("Failed to create Supabase client: %s", e)
+                raise Exception(f"Failed to initialize Supabase client: {str(e)}")
+    return _SUPABASE_CLIENT
+
+def reset_supabase_client():
+    """Drop the shared Supabase client so the next call builds a new one (for tests)"""
+    global _SUPABASE_CLIENT
+    with _CLIENT_LOCK:
+        _SUPABASE_CLIENT = None
+
+# --- Blacklist Cache ---
+# Agents check every command they run, but blacklists change rarely; cache each
+# user's set for a short while and drop it whenever the user edits it
+_BLACKLIST_CACHE = TTLCache(maxsize=10_000, ttl=config.BLACKLIST_CACHE_TTL)
+_BLACKLIST_CACHE_LOCK = threading.Lock()
+
+def get_cached_blacklist(supabase, root_user_id):
+    """Get the user's blacklisted commands as a frozenset, cached for BLACKLIST_CACHE_TTL"""
+    key = str(root_user_id)
+    with _BLACKLIST_CACHE_LOCK:
+        blacklist = _BLACKLIST_CACHE.get(key)
+    if blacklist is None:
+        response = supabase.table('blacklist').select('command').eq('root_user_id', key).execute()
+        blacklist = frozenset(row['command'] for row in response.data)
+        with _BLACKLIST_CACHE_LOCK:
+            _BLACKLIST_CACHE[key] = blacklist
+    return blacklist
+
+def invalidate_blacklist_cache(root_user_id):
+    """Drop the cached blacklist for a user after it changes"""
+    with _BLACKLIST_CACHE_LOCK:
+        _BLACKLIST_CACHE.pop(str(root_user_id), None)
 
 # --- Authentication Helpers ---
+# bcrypt releases the GIL, so hashing runs on a bounded pool sized to the CPU
+# count; concurrent logins use every core without oversubscribing them
+def _create_bcrypt_pool():
+    """Create the bcrypt pool on native threads, even when gevent has patched threading"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        monkey = None
+    if monkey is not None and monkey.is_module_patched('threading'):
+        # Green threads would run bcrypt on the event loop and stall every request
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+        return NativeThreadPoolExecutor(max_workers=os.cpu_count())
+    return ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix='bcrypt')
+
+_BCRYPT_POOL = _create_bcrypt_pool()
+
 def hash_password(password):
     """Hash a password using bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    salt = bcrypt.gensalt(rounds=config.BCRYPT_ROUNDS)
+    return _BCRYPT_POOL.submit(bcrypt.hashpw, password.encode('utf-8'), salt).result().decode('utf-8')
 
 def verify_password(password, hashed):
     """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    return _BCRYPT_POOL.submit(bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8')).result()
+
+def needs_rehash(hashed):
+    """Check whether a stored hash ($2b$<cost>$...) uses a different cost than configured"""
+    try:
+        return int(hashed.split('$')[2]) != config.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+@app.cli.command('bench-bcrypt')
+def bench_bcrypt():
+    """Time bcrypt hashing for cost factors 10-14 to help pick BCRYPT_ROUNDS"""
+    for cost in range(10, 15):
+        start = time.perf_counter()
+        bcrypt.hashpw(b'benchmark-password', bcrypt.gensalt(rounds=cost))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"cost={cost}: {elapsed_ms:.1f} ms")
+
+def parse_json_body(schema):
+    """Validate the JSON request body against a schema and return it as plain JSON data"""
+    return schema.model_validate_json(request.get_data()).model_dump(mode='json')
+
+@app.errorhandler(ValidationError)
+def handle_validation_error(e):
+    """Reject request bodies that fail schema validation"""
+    fields = sorted({'.'.join(str(part) for part in err['loc']) or 'body' for err in e.errors()})
+    return jsonify({"error": f"Missing or invalid fields: {', '.join(fields)}"}), 400
+
+def list_etag(*parts):
+    """Build an ETag for a polled list from its database change token"""
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+def etag_response(response, etag):
+    """Attach an ETag and make clients revalidate the response on every poll"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# Approval endpoints answer with one of a handful of {"status": ...} bodies;
+# encode them once. Each request still gets its own Response, since Flask
+# mutates response headers (session cookie, ETag) after the view returns.
+_STATUS_BODIES = {s: orjson.dumps({'status': s}) for s in ('approved', 'denied', 'expired', 'pending', 'rejected')}
+
+def status_response(status):
+    """Build a {"status": ...} JSON response from its pre-encoded body"""
+    body = _STATUS_BODIES.get(status)
+    if body is None:
+        return jsonify({"status": status})
+    return app.response_class(body, mimetype='application/json')
 
 def require_auth(f):
     """Decorator to require authentication"""
+    @wraps(f)
     def decorated_function(*args, **kwargs):
-        print(f"DEBUG: require_auth called for {f.__name__}, session: {dict(session)}")
         if 'user_id' not in session:
-            print("DEBUG: No user_id in session, redirecting to login")
+            logger.debug("No user_id in session for %s, redirecting to login", f.__name__)
             return redirect(url_for('login'))
-        print(f"DEBUG: User authenticated: {session['user_id']}")
         return f(*args, **kwargs)
-    decorated_function.__name__ = f.__name__
     return decorated_function
 
+def request_user_id():
+    """Resolve the acting user from the query string or session once per request"""
+    if 'user_id' not in g:
+        g.user_id = request.args.get('user_id') or session.get('user_id')
+    return g.user_id
+
 # Frontend files are now in the frontend/ directory
 
 # --- Authentication Routes ---
@@ -87,18 +268,24 @@ def api_login():
     password = data.get('password')
     
     try:
-        print(f"DEBUG: Login attempt for username: {username}")
+        logger.debug("Login attempt for username: %s", username)
         supabase = get_supabase_client()
-        response = supabase.table('root_users').select('*').eq('username', username).eq('is_active', True).execute()
-        
-        print(f"DEBUG: Database response: {response.data}")
+        response = supabase.table('root_users').select('id, username, password_hash').eq('username', username).eq('is_active', True).maybe_single().execute()
         
-        if response.data:
-            user_data = response.data[0]
-            print(f"DEBUG: Found user: {user_data['username']}, checking password...")
+        if response is not None:
+            user_data = response.data
+            logger.debug("Found user: %s, checking password...", user_data['username'])
             
             if verify_password(password, user_data['password_hash']):
-                print(f"DEBUG: Password verified successfully")
+                logger.debug("Password verified successfully")
+                if needs_rehash(user_data['password_hash']):
+                    # Upgrade the stored hash to the configured cost while we have the password
+                    try:
+                        supabase.table('root_users').update({
+                            'password_hash': hash_password(password)
+                        }, returning='minimal').eq('id', user_data['id']).execute()
+                    except Exception as e:
+                        logger.warning("Password rehash failed: %s", e)
                 session['user_id'] = user_data['id']
                 session['username'] = user_data['username']
                 session.permanent = True
@@ -109,13 +296,13 @@ def api_login():
                     "username": user_data['username']
                 })
             else:
-                print(f"DEBUG: Password verification failed")
+                logger.debug("Password verification failed")
                 return jsonify({"error": "Invalid password"}), 401
         else:
-            print(f"DEBUG: No user found with username: {username}")
+            logger.debug("No user found with username: %s", username)
             return jsonify({"error": "User not found"}), 401
     except Exception as e:
-        print(f"DEBUG: Login exception: {str(e)}")
+        logger.exception("Error in api_login: %s", e)
         return jsonify({"error": f"Login failed: {str(e)}"}), 500
 
 @app.route('/api/auth/register', methods=['POST'])
@@ -145,7 +332,8 @@ def api_register():
             # Add default blacklist for new user
             default_commands = ['rm', 'sudo', 'fdisk', 'mkfs']
             blacklist_data = [{'root_user_id': response.data[0]['id'], 'command': cmd} for cmd in default_commands]
-            supabase.table('blacklist').insert(blacklist_data).execute()
+            supabase.table('blacklist').insert(blacklist_data, returning='minimal').execute()
+            invalidate_blacklist_cache(response.data[0]['id'])
             
             return jsonify({"success": True, "message": "Registration successful"})
         else:
@@ -162,28 +350,28 @@ def logout():
 @app.route('/dashboard')
 @require_auth
 def dashboard():
-    print("DEBUG: Serving dashboard HTML")
+    logger.debug("Serving dashboard HTML")
     return send_from_directory('frontend', 'index.html')
 
 @app.route('/styles.css')
 def serve_css():
-    print("DEBUG: Serving CSS file")
-    return send_from_directory('frontend', 'styles.css')
+    logger.debug("Serving CSS file")
+    return send_from_directory('frontend', 'styles.css', max_age=config.STATIC_MAX_AGE)
 
 @app.route('/app.js')
 def serve_js():
-    print("DEBUG: Serving JS file")
-    return send_from_directory('frontend', 'app.js')
+    logger.debug("Serving JS file")
+    return send_from_directory('frontend', 'app.js', max_age=config.STATIC_MAX_AGE)
 
 @app.route('/safe-cli-installer.sh')
 def serve_installer():
-    print("DEBUG: Serving installer script")
-    return send_from_directory('.', 'safe-cli-installer.sh')
+    logger.debug("Serving installer script")
+    return send_from_directory('.', 'safe-cli-installer.sh', max_age=config.STATIC_MAX_AGE)
 
 @app.route('/fix-endpoint-issue.sh')
 def serve_fix_script():
-    print("DEBUG: Serving endpoint fix script")
-    return send_from_directory('.', 'fix-endpoint-issue.sh')
+    logger.debug("Serving endpoint fix script")
+    return send_from_directory('.', 'fix-endpoint-issue.sh', max_age=config.STATIC_MAX_AGE)
 
 # --- API Endpoints ---
 @app.route('/api/auth/check', methods=['GET'])
@@ -224,39 +412,38 @@ def get_agent_blacklist():
 @app.route('/api/agent/check_command', methods=['POST'])
 def check_command():
     """Check if command should be blocked or allowed (no authentication required)"""
+    data = parse_json_body(CheckCommandIn)
     try:
-        data = request.json
-        print(f"DEBUG: check_command called with data: {data}")
-        if not all(key in data for key in ['command', 'root_user_id', 'endpoint_id']):
-            print(f"DEBUG: Missing required fields. Got: {list(data.keys()) if data else 'None'}")
-            return jsonify({"error": "Missing required fields"}), 400
-        
+        logger.debug("check_command called with data: %s", data)
         command = data['command']
         root_user_id = data['root_user_id']
         endpoint_id = data['endpoint_id']
         
         supabase = get_supabase_client()
         
-        # Check if command is in blacklist
-        print(f"DEBUG: Checking blacklist for command '{command}' and user '{root_user_id}'")
-        blacklist_response = supabase.table('blacklist').select('command').eq('root_user_id', root_user_id).eq('command', command).execute()
-        print(f"DEBUG: Blacklist response: {blacklist_response.data}")
-        
-        # Also check all blacklist entries for this user
-        all_blacklist = supabase.table('blacklist').select('command').eq('root_user_id', root_user_id).execute()
-        print(f"DEBUG: All blacklist entries for user: {all_blacklist.data}")
+        # Commands missing from the cached blacklist are allowed without a round trip
+        logger.debug("Checking blacklist for command '%s' and user '%s'", command, root_user_id)
+        if command not in get_cached_blacklist(supabase, root_user_id):
+            logger.debug("Command '%s' is NOT in blacklist, allowing it", command)
+            return jsonify({
+                "blocked": False,
+                "message": "Command allowed"
+            })
         
-        # Check if endpoint exists
-        endpoint_check = supabase.table('endpoints').select('id, name, user_name').eq('id', endpoint_id).execute()
-        print(f"DEBUG: Endpoint check: {endpoint_check.data}")
+        # Confirm against the database (the cache may be stale) and fetch the
+        # endpoint's user_name in one round trip
+        check_response = supabase.rpc('check_command_rpc', {
+            'p_user': root_user_id,
+            'p_endpoint': endpoint_id,
+            'p_cmd': command
+        }).execute()
+        logger.debug("Command check response: %s", check_response.data)
         
-        if blacklist_response.data:
+        if check_response.data['blacklisted']:
             # Command is blacklisted, create approval request
-            print(f"DEBUG: Command '{command}' IS in blacklist, creating approval request")
-            # Get endpoint info to get user_name
-            endpoint_response = supabase.table('endpoints').select('user_name').eq('id', endpoint_id).execute()
-            user_name = endpoint_response.data[0]['user_name'] if endpoint_response.data else 'unknown'
-            print(f"DEBUG: Endpoint user_name: {user_name}")
+            logger.debug("Command '%s' IS in blacklist, creating approval request", command)
+            user_name = check_response.data['user_name'] or 'unknown'
+            logger.debug("Endpoint user_name: %s", user_name)
             
             approval_data = {
                 'endpoint_id': endpoint_id,
@@ -265,39 +452,37 @@ def check_command():
                 'status': 'pending',
                 'created_at': datetime.now(timezone.utc).isoformat()
             }
-            print(f"DEBUG: Creating approval request with data: {approval_data}")
+            logger.debug("Creating approval request with data: %s", approval_data)
             
             approval_response = supabase.table('approval_requests').insert(approval_data).execute()
-            print(f"DEBUG: Approval response: {approval_response.data}")
+            logger.debug("Approval response: %s", approval_response.data)
             
             if approval_response.data:
-                print(f"DEBUG: Successfully created approval request: {approval_response.data[0]['id']}")
+                logger.debug("Successfully created approval request: %s", approval_response.data[0]['id'])
                 return jsonify({
                     "blocked": True,
                     "request_id": approval_response.data[0]['id'],
                     "message": "Command blocked - approval required"
                 })
             else:
-                print(f"DEBUG: Failed to create approval request")
+                logger.debug("Failed to create approval request")
                 return jsonify({"error": "Failed to create approval request"}), 500
         else:
-            # Command is not blacklisted, allow it
-            print(f"DEBUG: Command '{command}' is NOT in blacklist, allowing it")
+            # Command was removed since the blacklist was cached; allow it and refresh
+            logger.debug("Command '%s' is NOT in blacklist, allowing it", command)
+            invalidate_blacklist_cache(root_user_id)
             return jsonify({
                 "blocked": False,
                 "message": "Command allowed"
             })
             
     except Exception as e:
-        print(f"DEBUG: Error in check_command: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in check_command: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/blacklist', methods=['POST'])
 def update_blacklist():
-    # Get user_id from query parameter or session
-    user_id = request.args.get('user_id') or session.get('user_id')
+    user_id = request_user_id()
     if not user_id:
         return jsonify({"error": "User ID required"}), 400
         
@@ -308,14 +493,12 @@ def update_blacklist():
     try:
         supabase = get_supabase_client()
         
-        # Clear existing blacklist for current user
-        supabase.table('blacklist').delete().eq('root_user_id', user_id).execute()
+        # Replace the user's blacklist; the database only deletes removed
+        # commands and inserts new ones
+        commands = list(dict.fromkeys(cmd.strip() for cmd in data['blacklist'] if cmd.strip()))
+        supabase.rpc('set_blacklist', {'p_user': user_id, 'p_cmds': commands}).execute()
         
-        # Insert new blacklist commands
-        if data['blacklist']:
-            commands_data = [{'root_user_id': user_id, 'command': cmd.strip()} for cmd in data['blacklist'] if cmd.strip()]
-            if commands_data:
-                supabase.table('blacklist').insert(commands_data).execute()
+        invalidate_blacklist_cache(user_id)
         
         return jsonify({"status": "success"}), 200
     except Exception as e:
@@ -323,50 +506,36 @@ def update_blacklist():
 
 @app.route('/api/register_endpoint', methods=['POST'])
 def register_endpoint():
-    data = request.json
-    if not all(key in data for key in ['root_user_id', 'name', 'hostname', 'user_name']):
-        return jsonify({"error": "Missing required fields: root_user_id, name, hostname, user_name"}), 400
+    data = parse_json_body(RegisterEndpointIn)
     
     try:
         supabase = get_supabase_client()
         
         # Verify root user exists
-        user_check = supabase.table('root_users').select('id').eq('id', data['root_user_id']).eq('is_active', True).execute()
-        if not user_check.data:
+        user_check = supabase.table('root_users').select('id').eq('id', data['root_user_id']).eq('is_active', True).maybe_single().execute()
+        if user_check is None:
             return jsonify({"error": "Invalid root user"}), 400
         
         # Get client IP address
         client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR', ''))
         
-        # Check if endpoint already exists
-        existing = supabase.table('endpoints').select('id').eq('hostname', data['hostname']).eq('user_name', data['user_name']).eq('root_user_id', data['root_user_id']).execute()
+        now_iso = datetime.now(timezone.utc).isoformat()
+        
+        # Insert the endpoint, or refresh it if this (hostname, user_name,
+        # root_user_id) is already registered, in one atomic upsert
+        response = supabase.table('endpoints').upsert({
+            'root_user_id': data['root_user_id'],
+            'name': data['name'],
+            'hostname': data['hostname'],
+            'ip_address': client_ip,
+            'user_name': data['user_name'],
+            'os_info': data['os_info'],
+            'last_seen': now_iso,
+            'is_active': True,
+            'updated_at': now_iso
+        }, on_conflict='hostname,user_name,root_user_id').execute()
         
-        if existing.data:
-            # Update existing endpoint
-            response = supabase.table('endpoints').update({
-                'name': data['name'],
-                'ip_address': client_ip,
-                'os_info': data.get('os_info', ''),
-                'last_seen': datetime.now(timezone.utc).isoformat(),
-                'is_active': True,
-                'updated_at': datetime.now(timezone.utc).isoformat()
-            }).eq('id', existing.data[0]['id']).execute()
-            
-            endpoint_id = existing.data[0]['id']
-        else:
-            # Create new endpoint
-            response = supabase.table('endpoints').insert({
-                'root_user_id': data['root_user_id'],
-                'name': data['name'],
-                'hostname': data['hostname'],
-                'ip_address': client_ip,
-                'user_name': data['user_name'],
-                'os_info': data.get('os_info', ''),
-                'last_seen': datetime.now(timezone.utc).isoformat(),
-                'is_active': True
-            }).execute()
-            
-            endpoint_id = response.data[0]['id']
+        endpoint_id = response.data[0]['id']
         
         return jsonify({"endpoint_id": str(endpoint_id), "status": "registered"})
     except Exception as e:
@@ -374,16 +543,14 @@ def register_endpoint():
 
 @app.route('/api/request_approval', methods=['POST'])
 def request_approval():
-    data = request.json
-    if not all(key in data for key in ['endpoint_id', 'user', 'command']):
-        return jsonify({"error": "Missing required fields: endpoint_id, user, command"}), 400
+    data = parse_json_body(RequestApprovalIn)
     
     try:
         supabase = get_supabase_client()
         
         # Verify endpoint exists and is active
-        endpoint_check = supabase.table('endpoints').select('id,is_active').eq('id', data['endpoint_id']).execute()
-        if not endpoint_check.data or not endpoint_check.data[0]['is_active']:
+        endpoint_check = supabase.table('endpoints').select('is_active').eq('id', data['endpoint_id']).maybe_single().execute()
+        if endpoint_check is None or not endpoint_check.data['is_active']:
             return jsonify({"error": "Invalid or inactive endpoint"}), 400
         
         # Insert approval request
@@ -408,51 +575,43 @@ def get_endpoints():
             return jsonify([])
         supabase = get_supabase_client()
         
+        # Answer 304 while the user's endpoints are unchanged
+        version = supabase.rpc('endpoints_version', {'p_user': user_id}).execute().data
+        etag = list_etag('endpoints', user_id, version)
+        if etag in request.if_none_match:
+            return etag_response(app.response_class(status=304), etag)
+        
         # Get all endpoints for current user (both active and inactive)
         response = supabase.table('endpoints').select('*').eq('root_user_id', user_id).order('last_seen', desc=True).execute()
         
-        print(f"DEBUG: Supabase response: {response}")
-        print(f"DEBUG: Found {len(response.data)} endpoints for user {user_id}")
-        for endpoint in response.data:
-            print(f"DEBUG: Endpoint {endpoint['id']} - {endpoint['name']} - Active: {endpoint['is_active']}")
+        logger.debug("Supabase response: %s", response)
+        logger.debug("Found %d endpoints for user %s", len(response.data), user_id)
         
-        return jsonify(response.data)
+        return etag_response(jsonify(response.data), etag)
     except Exception as e:
-        print(f"DEBUG: Error in get_endpoints: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in get_endpoints: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/endpoints/<endpoint_id>/deactivate', methods=['POST'])
 def deactivate_endpoint(endpoint_id):
     """Deactivate endpoint (soft delete - keeps in database but marks as inactive)"""
     try:
-        # Get user_id from query parameter or session
-        user_id = request.args.get('user_id') or session.get('user_id')
+        user_id = request_user_id()
         if not user_id:
             return jsonify({"error": "User ID required"}), 400
             
         supabase = get_supabase_client()
         
-        # Verify endpoint belongs to current user
-        endpoint_check = supabase.table('endpoints').select('id, root_user_id').eq('id', endpoint_id).execute()
-        
-        if not endpoint_check.data:
-            return jsonify({"error": "Endpoint not found"}), 404
-        
-        if endpoint_check.data[0]['root_user_id'] != user_id:
-            return jsonify({"error": "Access denied"}), 403
-        
-        # Mark endpoint as inactive
+        # Mark endpoint as inactive; the owner filter doubles as the access check
         response = supabase.table('endpoints').update({
             'is_active': False,
             'updated_at': datetime.now(timezone.utc).isoformat()
-        }).eq('id', endpoint_id).execute()
+        }).eq('id', endpoint_id).eq('root_user_id', user_id).execute()
         
         if response.data:
             return jsonify({"status": "deactivated"})
         else:
-            return jsonify({"error": "Failed to deactivate endpoint"}), 500
+            return jsonify({"error": "Endpoint not found or access denied"}), 404
             
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -467,25 +626,16 @@ def activate_endpoint(endpoint_id):
             
         supabase = get_supabase_client()
         
-        # Verify endpoint belongs to current user
-        endpoint_check = supabase.table('endpoints').select('id, root_user_id').eq('id', endpoint_id).execute()
-        
-        if not endpoint_check.data:
-            return jsonify({"error": "Endpoint not found"}), 404
-        
-        if endpoint_check.data[0]['root_user_id'] != user_id:
-            return jsonify({"error": "Access denied"}), 403
-        
-        # Mark endpoint as active
+        # Mark endpoint as active; the owner filter doubles as the access check
         response = supabase.table('endpoints').update({
             'is_active': True,
             'updated_at': datetime.now(timezone.utc).isoformat()
-        }).eq('id', endpoint_id).execute()
+        }).eq('id', endpoint_id).eq('root_user_id', user_id).execute()
         
         if response.data:
             return jsonify({"status": "activated"})
         else:
-            return jsonify({"error": "Failed to activate endpoint"}), 500
+            return jsonify({"error": "Endpoint not found or access denied"}), 404
             
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -500,22 +650,13 @@ def delete_endpoint(endpoint_id):
             
         supabase = get_supabase_client()
         
-        # Verify endpoint belongs to current user
-        endpoint_check = supabase.table('endpoints').select('id, root_user_id').eq('id', endpoint_id).execute()
-        
-        if not endpoint_check.data:
-            return jsonify({"error": "Endpoint not found"}), 404
-        
-        if endpoint_check.data[0]['root_user_id'] != user_id:
-            return jsonify({"error": "Access denied"}), 403
-        
-        # Delete endpoint permanently
-        response = supabase.table('endpoints').delete().eq('id', endpoint_id).execute()
+        # Delete endpoint permanently; the owner filter doubles as the access check
+        response = supabase.table('endpoints').delete().eq('id', endpoint_id).eq('root_user_id', user_id).execute()
         
         if response.data:
             return jsonify({"status": "deleted"})
         else:
-            return jsonify({"error": "Failed to delete endpoint"}), 500
+            return jsonify({"error": "Endpoint not found or access denied"}), 404
             
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -530,33 +671,18 @@ def uninstall_endpoint(endpoint_id):
             
         supabase = get_supabase_client()
         
-        # Verify endpoint belongs to current user
-        endpoint_check = supabase.table('endpoints').select('id, root_user_id, endpoint_name').eq('id', endpoint_id).execute()
-        
-        if not endpoint_check.data:
-            return jsonify({"error": "Endpoint not found"}), 404
-        
-        if endpoint_check.data[0]['root_user_id'] != user_id:
-            return jsonify({"error": "Access denied"}), 403
-        
-        endpoint_name = endpoint_check.data[0]['endpoint_name']
-        
-        # Mark endpoint as uninstalling
-        supabase.table('endpoints').update({
-            'is_active': False,
-            'status': 'uninstalling'
-        }).eq('id', endpoint_id).execute()
-        
-        # Delete endpoint permanently
-        response = supabase.table('endpoints').delete().eq('id', endpoint_id).execute()
+        # Delete endpoint permanently; the owner filter doubles as the access
+        # check and the deleted row carries the name for the message
+        response = supabase.table('endpoints').delete().eq('id', endpoint_id).eq('root_user_id', user_id).execute()
         
         if response.data:
+            endpoint_name = response.data[0]['name']
             return jsonify({
                 "status": "uninstalled", 
                 "message": f"Endpoint '{endpoint_name}' has been marked for uninstall. The agent will clean up automatically on the next command attempt."
             })
         else:
-            return jsonify({"error": "Failed to uninstall endpoint"}), 500
+            return jsonify({"error": "Endpoint not found or access denied"}), 404
             
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -564,11 +690,8 @@ def uninstall_endpoint(endpoint_id):
 @app.route('/api/agent/deregister', methods=['POST'])
 def agent_deregister():
     """Allow agent to deregister itself without authentication"""
+    data = parse_json_body(AgentDeregisterIn)
     try:
-        data = request.json
-        if not all(key in data for key in ['endpoint_id', 'root_user_id']):
-            return jsonify({"error": "Missing required fields: endpoint_id, root_user_id"}), 400
-            
         supabase = get_supabase_client()
         
         # Verify endpoint exists and belongs to the specified user
@@ -594,268 +717,243 @@ def agent_deregister():
 @app.route('/api/requests', methods=['GET'])
 def get_requests():
     try:
-        # Get user_id from query parameter or session
-        user_id = request.args.get('user_id') or session.get('user_id')
-        print(f"DEBUG: get_requests called, user_id from args: {request.args.get('user_id')}, from session: {session.get('user_id')}, final: {user_id}")
+        user_id = request_user_id()
+        logger.debug("get_requests called, user_id: %s", user_id)
         if not user_id:
             # If no user_id provided, return empty requests (not an error)
-            print("DEBUG: No user_id provided, returning empty requests")
+            logger.debug("No user_id provided, returning empty requests")
             return jsonify([])
             
         supabase = get_supabase_client()
         
-        # First get all pending requests
-        response = supabase.table('approval_requests').select('id, user_name, command, created_at, endpoint_id').eq('status', 'pending').order('created_at', desc=True).execute()
-        
-        # Get all endpoints for current user
-        endpoints_response = supabase.table('endpoints').select('id, name, hostname, user_name, root_user_id').eq('root_user_id', user_id).execute()
-        
-        # Create a lookup dictionary for endpoints
-        endpoints_lookup = {ep['id']: ep for ep in endpoints_response.data}
-        
-        # Check for expired requests and mark them as rejected
-        current_time = datetime.now(timezone.utc)
-        expired_request_ids = []
-        
-        for req in response.data:
-            try:
-                # Parse the timestamp
-                if 'T' in req['created_at'] or 'Z' in req['created_at']:
-                    request_time = datetime.fromisoformat(req['created_at'].replace('Z', '+00:00'))
-                else:
-                    request_time = datetime.fromtimestamp(float(req['created_at']), tz=timezone.utc)
-                
-                # Check if request is older than 30 seconds
-                if (current_time - request_time).total_seconds() > 30:
-                    expired_request_ids.append(req['id'])
-                    print(f"DEBUG: Request {req['id']} is expired, marking as rejected")
-            except Exception as e:
-                print(f"DEBUG: Error parsing timestamp for request {req['id']}: {e}")
-                # If we can't parse the timestamp, consider it expired
-                expired_request_ids.append(req['id'])
-        
-        # Mark expired requests as rejected in the database
-        if expired_request_ids:
-            supabase.table('approval_requests').update({
-                'status': 'rejected',
-                'updated_at': current_time.isoformat()
-            }).in_('id', expired_request_ids).execute()
-            print(f"DEBUG: Marked {len(expired_request_ids)} requests as rejected")
-            
-            # Remove expired requests from our response data
-            response.data = [req for req in response.data if req['id'] not in expired_request_ids]
-        
-        print(f"DEBUG: Supabase response: {response}")
-        print(f"DEBUG: Response data: {response.data}")
-        
-        # Filter requests for current user and convert to expected format
+        # Answer 304 while the user's pending requests are unchanged
+        version = supabase.rpc('approval_requests_version', {'p_user': user_id}).execute().data
+        etag = list_etag('requests', user_id, version)
+        if etag in request.if_none_match:
+            return etag_response(app.response_class(status=304), etag)
+        
+        # Get the user's pending requests that are still within the approval
+        # window, with their endpoint embedded. Stale ones are rejected by the
+        # expire-approval-requests database job; the cutoff hides any it has
+        # not reached yet.
+        cutoff = (datetime.now(timezone.utc) - APPROVAL_TIMEOUT).isoformat()
+        response = supabase.table('approval_requests').select(
+            'id, user_name, command, created_at, endpoints!inner(name, hostname, user_name)'
+        ).eq('status', 'pending').eq('endpoints.root_user_id', user_id).gt('created_at', cutoff).order('created_at', desc=True).execute()
+        
+        # Convert to expected format
         pending = {}
-        print(f"DEBUG: Found {len(response.data)} total requests")
-        print(f"DEBUG: Found {len(endpoints_lookup)} endpoints for user")
-        
         for req in response.data:
-            print(f"DEBUG: Processing request {req['id']}")
-            print(f"DEBUG: Request endpoint_id: {req['endpoint_id']}")
-            
-            # Check if this request belongs to current user by looking up the endpoint
-            endpoint = endpoints_lookup.get(req['endpoint_id'])
-            if endpoint:
-                print(f"DEBUG: Request {req['id']} belongs to current user")
-                req_id = str(req['id'])
-                pending[req_id] = {
-                    'user': req['user_name'],
-                    'command': req['command'],
-                    'timestamp': req['created_at'],
-                    'endpoint_name': endpoint.get('name', 'Unknown'),
-                    'endpoint_hostname': endpoint.get('hostname', 'Unknown'),
-                    'endpoint_user': endpoint.get('user_name', 'Unknown')
-                }
-            else:
-                print(f"DEBUG: Request {req['id']} does not belong to current user")
+            endpoint = req['endpoints']
+            pending[str(req['id'])] = {
+                'user': req['user_name'],
+                'command': req['command'],
+                'timestamp': req['created_at'],
+                'endpoint_name': endpoint.get('name', 'Unknown'),
+                'endpoint_hostname': endpoint.get('hostname', 'Unknown'),
+                'endpoint_user': endpoint.get('user_name', 'Unknown')
+            }
         
-        print(f"DEBUG: Returning {len(pending)} pending requests")
+        logger.debug("Returning %d pending requests", len(pending))
         
-        return jsonify(pending)
+        return etag_response(jsonify(pending), etag)
     except Exception as e:
-        print(f"DEBUG: Error in get_requests: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in get_requests: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/approve/<req_id>', methods=['POST'])
 def approve_request(req_id):
     try:
-        # Get user_id from query parameter or session
-        user_id = request.args.get('user_id') or session.get('user_id')
+        user_id = request_user_id()
         if not user_id:
             return jsonify({"error": "User ID required"}), 400
             
         supabase = get_supabase_client()
         
-        # Verify request exists and belongs to current user
-        request_check = supabase.table('approval_requests').select('id, endpoint_id').eq('id', req_id).execute()
-        
-        if not request_check.data:
-            return jsonify({"error": "Request not found"}), 404
-        
-        req_data = request_check.data[0]
-        endpoint_id = req_data['endpoint_id']
-        
-        # Check if endpoint belongs to current user
-        endpoint_check = supabase.table('endpoints').select('id, root_user_id').eq('id', endpoint_id).eq('root_user_id', user_id).execute()
-        
-        if not endpoint_check.data:
-            return jsonify({"error": "Access denied"}), 403
-        
-        response = supabase.table('approval_requests').update({
-            'status': 'approved',
-            'updated_at': datetime.now(timezone.utc).isoformat()
-        }).eq('id', req_id).eq('status', 'pending').execute()
+        # Update the request only if it is pending and its endpoint belongs to
+        # the current user, in a single statement
+        response = supabase.rpc('resolve_approval_request', {
+            'p_req': req_id,
+            'p_user': user_id,
+            'p_status': 'approved'
+        }).execute()
         
         if not response.data:
             return jsonify({"error": "Request not found or already processed"}), 404
         
-        return jsonify({"status": "approved"})
+        record_approval_decision(req_id, 'approved')
+        notify_approval(req_id)
+        return status_response('approved')
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/deny/<req_id>', methods=['POST'])
 def deny_request(req_id):
     try:
-        # Get user_id from query parameter or session
-        user_id = request.args.get('user_id') or session.get('user_id')
+        user_id = request_user_id()
         if not user_id:
             return jsonify({"error": "User ID required"}), 400
             
         supabase = get_supabase_client()
         
-        # Verify request exists and belongs to current user
-        request_check = supabase.table('approval_requests').select('id, endpoint_id').eq('id', req_id).execute()
-        
-        if not request_check.data:
-            return jsonify({"error": "Request not found"}), 404
-
-        req_data = request_check.data[0]
-        endpoint_id = req_data['endpoint_id']
-        
-        # Check if endpoint belongs to current user
-        endpoint_check = supabase.table('endpoints').select('id, root_user_id').eq('id', endpoint_id).eq('root_user_id', user_id).execute()
-        
-        if not endpoint_check.data:
-            return jsonify({"error": "Access denied"}), 403
-        
-        response = supabase.table('approval_requests').update({
-            'status': 'denied',
-            'updated_at': datetime.now(timezone.utc).isoformat()
-        }).eq('id', req_id).eq('status', 'pending').execute()
+        # Update the request only if it is pending and its endpoint belongs to
+        # the current user, in a single statement
+        response = supabase.rpc('resolve_approval_request', {
+            'p_req': req_id,
+            'p_user': user_id,
+            'p_status': 'denied'
+        }).execute()
         
         if not response.data:
             return jsonify({"error": "Request not found or already processed"}), 404
         
-        return jsonify({"status": "denied"})
+        record_approval_decision(req_id, 'denied')
+        notify_approval(req_id)
+        return status_response('denied')
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# --- Approval Status ---
+# Long-polling agents wait on a per-request event. Approving or denying in this
+# process sets it, so the waiter answers at once; decisions made on other
+# instances are picked up by the waiter's periodic re-check.
+APPROVAL_RECHECK_INTERVAL = 2  # seconds
+_APPROVAL_EVENTS = {}  # req_id -> [event, number of waiters]
+_APPROVAL_EVENTS_LOCK = threading.Lock()
+
+def _acquire_approval_event(req_id):
+    """Get the shared wake-up event for a request, creating it if needed"""
+    with _APPROVAL_EVENTS_LOCK:
+        entry = _APPROVAL_EVENTS.get(req_id)
+        if entry is None:
+            entry = _APPROVAL_EVENTS[req_id] = [threading.Event(), 0]
+        entry[1] += 1
+        return entry[0]
+
+def _release_approval_event(req_id, event):
+    """Forget a request's event once its last waiter is done with it"""
+    with _APPROVAL_EVENTS_LOCK:
+        entry = _APPROVAL_EVENTS.get(req_id)
+        if entry is not None and entry[0] is event:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _APPROVAL_EVENTS[req_id]
+
+def notify_approval(req_id):
+    """Wake any local waiters for a request whose status just changed"""
+    with _APPROVAL_EVENTS_LOCK:
+        entry = _APPROVAL_EVENTS.pop(req_id, None)
+    if entry is not None:
+        entry[0].set()
+
+# Agents poll the same request many times a second; serve repeat polls from a
+# short-lived cache and drop the entry whenever this process decides the request.
+# Decided requests never change again, so their status is kept much longer.
+APPROVAL_TERMINAL_STATUSES = frozenset({'approved', 'denied', 'rejected', 'expired'})
+_APPROVAL_STATUS_CACHE = TTLCache(maxsize=10_000, ttl=config.APPROVAL_STATUS_CACHE_TTL)
+_APPROVAL_DECISION_CACHE = TTLCache(maxsize=10_000, ttl=config.APPROVAL_DECISION_CACHE_TTL)
+_APPROVAL_STATUS_CACHE_LOCK = threading.Lock()
+
+def get_approval_status(supabase, req_id):
+    """Get the status of an approval request; stale ones read as 'expired'"""
+    with _APPROVAL_STATUS_CACHE_LOCK:
+        status = _APPROVAL_DECISION_CACHE.get(req_id) or _APPROVAL_STATUS_CACHE.get(req_id)
+    if status is not None:
+        return status
+    
+    # The view derives the expiry; the expire-approval-requests job persists it
+    response = supabase.table('v_approval_requests').select('status').eq('id', req_id).maybe_single().execute()
+    status = response.data['status'] if response is not None else 'expired'
+    
+    with _APPROVAL_STATUS_CACHE_LOCK:
+        if status in APPROVAL_TERMINAL_STATUSES:
+            _APPROVAL_DECISION_CACHE[req_id] = status
+        else:
+            _APPROVAL_STATUS_CACHE[req_id] = status
+    return status
+
+def record_approval_decision(req_id, status):
+    """Remember the final status of an approval request decided by this process"""
+    with _APPROVAL_STATUS_CACHE_LOCK:
+        _APPROVAL_STATUS_CACHE.pop(req_id, None)
+        _APPROVAL_DECISION_CACHE[req_id] = status
+
 @app.route('/api/check_approval/<req_id>', methods=['GET'])
 def check_approval(req_id):
     try:
         supabase = get_supabase_client()
-        
-        # Get the request status
-        response = supabase.table('approval_requests').select('status, created_at').eq('id', req_id).execute()
-        
-        if not response.data:
-            return jsonify({"status": "expired"})
-        
-        request_data = response.data[0]
-        status = request_data['status']
-        created_at = request_data['created_at']
-        
-        # Check if request is older than 30 seconds (expired)
-        from datetime import datetime, timezone, timedelta
-        try:
-            print(f"DEBUG: Checking expiration for request {req_id}")
-            print(f"DEBUG: created_at: {created_at}")
-            print(f"DEBUG: current status: {status}")
-            
-            # Parse the timestamp - handle both ISO format and Unix timestamp
-            if 'T' in created_at or 'Z' in created_at:
-                # ISO format
-                request_time = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-            else:
-                # Unix timestamp
-                request_time = datetime.fromtimestamp(float(created_at), tz=timezone.utc)
-            
-            current_time = datetime.now(timezone.utc)
-            time_diff = current_time - request_time
-            
-            print(f"DEBUG: request_time: {request_time}")
-            print(f"DEBUG: current_time: {current_time}")
-            print(f"DEBUG: time_diff: {time_diff}")
-            print(f"DEBUG: time_diff seconds: {time_diff.total_seconds()}")
-            
-            if time_diff > timedelta(seconds=30):
-                print(f"DEBUG: Request expired, marking as rejected...")
-                # Mark expired request as rejected instead of deleting
-                supabase.table('approval_requests').update({
-                    'status': 'rejected',
-                    'updated_at': current_time.isoformat()
-                }).eq('id', req_id).execute()
-                return jsonify({"status": "expired"})
-            else:
-                print(f"DEBUG: Request still valid, time remaining: {30 - time_diff.total_seconds()} seconds")
-        except Exception as e:
-            print(f"Timestamp parsing error: {e}")
-            pass  # If timestamp parsing fails, continue with normal flow
-        
-        # If approved, the request is already marked as approved in the database
-        # No need to delete it, just return the status
-        
-        return jsonify({"status": status})
+        return status_response(get_approval_status(supabase, req_id))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/test/session', methods=['GET'])
-def test_session():
-    """Test endpoint to check session data"""
-    return jsonify({
-        "session": dict(session),
-        "user_id": session.get('user_id'),
-        "username": session.get('username')
-    })
-
-@app.route('/test/register_endpoint', methods=['POST'])
-def test_register_endpoint():
-    """Test endpoint to manually register an endpoint"""
+@app.route('/api/wait_approval/<req_id>', methods=['GET'])
+def wait_approval(req_id):
+    """Long-poll for a decision: returns as soon as the request leaves 'pending',
+    or with 'pending' after ?timeout= seconds (capped at APPROVAL_WAIT_TIMEOUT)"""
     try:
-        data = request.json
-        endpoint_data = {
-            'name': data.get('name', 'test-endpoint'),
-            'root_user_id': data.get('root_user_id', 'd9c4b7ec-c252-4a45-b1b0-f6098e0a6737'),
-            'hostname': data.get('hostname', 'test-machine'),
-            'user_name': data.get('user_name', 'testuser'),
-            'ip_address': data.get('ip_address', '127.0.0.1'),
-            'os_info': data.get('os_info', 'Linux'),
-            'is_active': True,
-            'created_at': datetime.now(timezone.utc).isoformat(),
-            'last_seen': datetime.now(timezone.utc).isoformat()
-        }
-        
         supabase = get_supabase_client()
-        response = supabase.table('endpoints').insert(endpoint_data).execute()
-        
-        if response.data:
-            return jsonify({
-                "status": "success",
-                "endpoint_id": response.data[0]['id'],
-                "message": "Endpoint registered successfully"
-            })
-        else:
-            return jsonify({"error": "Failed to register endpoint"}), 500
-            
+        timeout = request.args.get('timeout', config.APPROVAL_WAIT_TIMEOUT, type=float)
+        if not math.isfinite(timeout):
+            timeout = config.APPROVAL_WAIT_TIMEOUT
+        deadline = time.monotonic() + min(max(timeout, 0), config.APPROVAL_WAIT_TIMEOUT)
+        event = _acquire_approval_event(req_id)
+        try:
+            while True:
+                status = get_approval_status(supabase, req_id)
+                remaining = deadline - time.monotonic()
+                if status != 'pending' or remaining <= 0:
+                    return status_response(status)
+                event.wait(min(remaining, APPROVAL_RECHECK_INTERVAL))
+        finally:
+            _release_approval_event(req_id, event)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Diagnostic routes; not registered in production
+if not config.PRODUCTION:
+    @app.route('/test/session', methods=['GET'])
+    def test_session():
+        """Test endpoint to check session data"""
+        return jsonify({
+            "session": dict(session),
+            "user_id": session.get('user_id'),
+            "username": session.get('username')
+        })
+
+    @app.route('/test/register_endpoint', methods=['POST'])
+    def test_register_endpoint():
+        """Test endpoint to manually register an endpoint"""
+        try:
+            data = request.json
+            now_iso = datetime.now(timezone.utc).isoformat()
+            endpoint_data = {
+                'name': data.get('name', 'test-endpoint'),
+                'root_user_id': data.get('root_user_id', 'd9c4b7ec-c252-4a45-b1b0-f6098e0a6737'),
+                'hostname': data.get('hostname', 'test-machine'),
+                'user_name': data.get('user_name', 'testuser'),
+                'ip_address': data.get('ip_address', '127.0.0.1'),
+                'os_info': data.get('os_info', 'Linux'),
+                'is_active': True,
+                'created_at': now_iso,
+                'last_seen': now_iso
+            }
+
+            supabase = get_supabase_client()
+            response = supabase.table('endpoints').insert(endpoint_data).execute()
+
+            if response.data:
+                return jsonify({
+                    "status": "success",
+                    "endpoint_id": response.data[0]['id'],
+                    "message": "Endpoint registered successfully"
+                })
+            else:
+                return jsonify({"error": "Failed to register endpoint"}), 500
+
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
 # --- Run the application ---
+# Local development only; deployments run under gunicorn (see gunicorn.conf.py)
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000, debug=config.DEBUG)
\ No newline at end of file
@@ -0,0 +1,15 @@
+-- Answer the agent's command check in one round trip: whether the command is
+-- blacklisted for the root user, plus the endpoint's user_name for the
+-- approval request that follows a block
+create or replace function check_command_rpc(p_user uuid, p_endpoint uuid, p_cmd text)
+returns json
+language sql
+stable
+as $$
+    select json_build_object(
+        'blacklisted', exists (
+            select 1 from blacklist where root_user_id = p_user and command = p_cmd
+        ),
+        'user_name', (select user_name from endpoints where id = p_endpoint)
+    );
+$$;
@@ -0,0 +1,13 @@
+-- Reject approval requests that have been pending for more than 30 seconds.
+-- Runs in the database so the dashboard's GET /api/requests stays read-only.
+create extension if not exists pg_cron;
+
+select cron.schedule(
+    'expire-approval-requests',
+    '5 seconds',
+    $$
+    update approval_requests
+    set status = 'rejected', updated_at = now()
+    where status = 'pending' and created_at < now() - interval '30 seconds'
+    $$
+);
@@ -0,0 +1,51 @@
+-- Indexes backing the equality filters and orderings used on every request.
+-- Plain CREATE INDEX is used because migrations run inside a transaction;
+-- on a large live table, run the statements by hand with CONCURRENTLY instead.
+
+-- check_command_rpc / GET /api/blacklist: blacklist by (root_user_id, command)
+create index if not exists idx_blacklist_user_cmd
+    on blacklist (root_user_id, command);
+
+-- POST /api/register_endpoint: one endpoint per (hostname, user_name, root_user).
+-- Earlier racy registrations can have left duplicates: keep the most recently
+-- seen row of each triple, move its siblings' approval requests onto it and
+-- drop the siblings, so the unique index can be built.
+with ranked as (
+    select id,
+           first_value(id) over w as keep_id,
+           row_number() over w as rn
+    from endpoints
+    where hostname is not null and user_name is not null and root_user_id is not null
+    window w as (partition by hostname, user_name, root_user_id
+                 order by last_seen desc nulls last, created_at desc nulls last, id)
+)
+update approval_requests ar
+set endpoint_id = r.keep_id
+from ranked r
+where ar.endpoint_id = r.id
+  and r.rn > 1;
+
+with ranked as (
+    select id,
+           row_number() over w as rn
+    from endpoints
+    where hostname is not null and user_name is not null and root_user_id is not null
+    window w as (partition by hostname, user_name, root_user_id
+                 order by last_seen desc nulls last, created_at desc nulls last, id)
+)
+delete from endpoints e
+using ranked r
+where e.id = r.id
+  and r.rn > 1;
+
+create unique index if not exists idx_endpoints_triple
+    on endpoints (hostname, user_name, root_user_id);
+
+-- GET /api/endpoints: the user's endpoints ordered by last_seen
+create index if not exists idx_endpoints_user_lastseen
+    on endpoints (root_user_id, last_seen desc);
+
+-- GET /api/requests and the expiry job: pending requests by age
+create index if not exists idx_approvals_status_created
+    on approval_requests (status, created_at desc)
+    where status = 'pending';
@@ -0,0 +1,27 @@
+-- Blacklist entries are a set per user: drop duplicate rows and enforce
+-- uniqueness so set_blacklist can insert with ON CONFLICT DO NOTHING
+delete from blacklist a
+using blacklist b
+where a.root_user_id = b.root_user_id
+  and a.command = b.command
+  and a.ctid > b.ctid;
+
+create unique index if not exists idx_blacklist_user_cmd_unique
+    on blacklist (root_user_id, command);
+
+-- Superseded by the unique index above
+drop index if exists idx_blacklist_user_cmd;
+
+-- Replace a user's blacklist in one round trip, touching only the rows that
+-- change: commands no longer listed are deleted and new ones inserted
+create or replace function set_blacklist(p_user uuid, p_cmds text[])
+returns void
+language sql
+as $$
+    delete from blacklist
+    where root_user_id = p_user and command <> all(p_cmds);
+
+    insert into blacklist (root_user_id, command)
+    select distinct p_user, cmd from unnest(p_cmds) as cmd
+    on conflict (root_user_id, command) do nothing;
+$$;
@@ -0,0 +1,29 @@
+-- Change tokens for the lists the dashboard polls. The server hashes them
+-- into ETags and answers 304 while they stay the same, skipping the full
+-- query and the response body.
+
+-- Pending requests inside the 30 second approval window for a user's
+-- endpoints (mirrors GET /api/requests)
+create or replace function approval_requests_version(p_user uuid)
+returns text
+language sql
+stable
+as $$
+    select concat_ws(':', count(*), max(ar.created_at), max(ar.updated_at), max(e.updated_at))
+    from approval_requests ar
+    join endpoints e on e.id = ar.endpoint_id
+    where e.root_user_id = p_user
+      and ar.status = 'pending'
+      and ar.created_at > now() - interval '30 seconds';
+$$;
+
+-- All of a user's endpoints (mirrors GET /api/endpoints)
+create or replace function endpoints_version(p_user uuid)
+returns text
+language sql
+stable
+as $$
+    select concat_ws(':', count(*), max(created_at), max(updated_at), max(last_seen))
+    from endpoints
+    where root_user_id = p_user;
+$$;
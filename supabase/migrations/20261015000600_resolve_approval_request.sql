@@ -0,0 +1,16 @@
+-- Approve or deny a pending request in one statement. The ownership check
+-- runs inside the UPDATE, so there is no window between checking and
+-- writing. Returns the request id, or no rows when the request does not
+-- exist, belongs to another user or was already processed.
+create or replace function resolve_approval_request(p_req uuid, p_user uuid, p_status text)
+returns setof uuid
+language sql
+as $$
+    update approval_requests
+    set status = p_status, updated_at = now()
+    where id = p_req
+      and status = 'pending'
+      and p_status in ('approved', 'denied')
+      and endpoint_id in (select id from endpoints where root_user_id = p_user)
+    returning id;
+$$;
@@ -0,0 +1,33 @@
+-- Approval requests as agents see them: requests pending for more than 30
+-- seconds, and those the expire-approval-requests job already rejected, read
+-- as 'expired'. Reads never have to write the expiry themselves.
+-- security_invoker (Postgres 15+) applies the caller's rights and any RLS on
+-- approval_requests instead of the view owner's.
+create or replace view v_approval_requests
+with (security_invoker = true) as
+select
+    id,
+    endpoint_id,
+    created_at,
+    case
+        when status = 'rejected' then 'expired'
+        when status = 'pending' and created_at < now() - interval '30 seconds' then 'expired'
+        else status
+    end as status
+from approval_requests;
+
+-- Requests the view already reports as expired can no longer be approved or
+-- denied, even before the expire-approval-requests job rejects them
+create or replace function resolve_approval_request(p_req uuid, p_user uuid, p_status text)
+returns setof uuid
+language sql
+as $$
+    update approval_requests
+    set status = p_status, updated_at = now()
+    where id = p_req
+      and status = 'pending'
+      and created_at >= now() - interval '30 seconds'
+      and p_status in ('approved', 'denied')
+      and endpoint_id in (select id from endpoints where root_user_id = p_user)
+    returning id;
+$$;
@@ -0,0 +1,8 @@
+-- Pending requests by endpoint. GET /api/requests and approval_requests_version
+-- reach approval_requests through the user's endpoints, so without this they
+-- scan every pending row of every user and discard the ones not joined.
+-- Lookups by request id (approve/deny, status polls) already use the primary
+-- key, and the expiry job uses idx_approvals_status_created.
+create index if not exists idx_approvals_pending_endpoint_created
+    on approval_requests (endpoint_id, created_at desc)
+    where status = 'pending';